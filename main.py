@@ -1,12 +1,27 @@
 import time
 import pygame
+import numpy as np
 import math
 import sys
 import json
-from typing import List, Tuple, Dict, Optional, Any, TypedDict
+import ast
+from typing import List, Tuple, Dict, Optional, Any, TypedDict, Callable, NamedTuple
+from collections import deque
 from enum import Enum
 from dataclasses import dataclass
 import random
+from functools import lru_cache
+from operator import itemgetter
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Константы
 WIDTH, HEIGHT = 1400, 700
@@ -14,6 +29,17 @@ FPS = 60
 CAR_LENGTH = 80
 CAR_WIDTH = 40
 SENSOR_RANGE = 400
+DECISION_HISTORY_SIZE = 2048
+CAR_CORNERS = np.array([
+    (-CAR_LENGTH / 2, -CAR_WIDTH / 2),
+    (CAR_LENGTH / 2, -CAR_WIDTH / 2),
+    (CAR_LENGTH / 2, CAR_WIDTH / 2),
+    (-CAR_LENGTH / 2, CAR_WIDTH / 2)
+], dtype=float)
+BODY_ANGLE_STEP = 2
+TARGET_OVERLAY_PAD = 8
+SENSOR_TEXT_COLORS = ((255, 150, 150), (255, 255, 150), (150, 255, 150))
+SENSOR_ANGLES = np.array([-135, -90, -45, -20, 20, 45, 90, 135], dtype=float)
 
 
 class ParkingPhase(Enum):
@@ -28,6 +54,11 @@ class ParkingPhase(Enum):
     ABORTED = "aborted"
 
 
+# Порядок фаз для ручного переключения
+PHASES = tuple(ParkingPhase)
+PHASE_INDEX = {phase: i for i, phase in enumerate(PHASES)}
+
+
 class Direction(Enum):
     FORWARD = "forward"
     BACKWARD = "backward"
@@ -39,7 +70,7 @@ class RulePriority(Enum):
     LOW = 1
 
 
-@dataclass
+@dataclass(slots=True)
 class ParkingSpot:
     x: float
     y: float
@@ -60,6 +91,21 @@ class ParkingConfig:
     steering_sensitivity: float = 0.3
 
 
+def _phase_literal(condition: str) -> Optional[str]:
+    """Значение фазы из условия вида phase == '...', иначе None"""
+    node = ast.parse(condition, mode="eval").body
+    if (isinstance(node, ast.Compare) and isinstance(node.left, ast.Name) and node.left.id == "phase"
+            and len(node.ops) == 1 and isinstance(node.ops[0], ast.Eq)
+            and isinstance(node.comparators[0], ast.Constant) and isinstance(node.comparators[0].value, str)):
+        return node.comparators[0].value
+    return None
+
+
+class Expr(NamedTuple):
+    """Выражение в действии правила, вычисляемое по фактам"""
+    source: str
+
+
 @dataclass
 class Rule:
     name: str
@@ -68,39 +114,29 @@ class Rule:
     actions: Dict[str, Any]
     description: str
 
-    def evaluate(self, context: Dict[str, Any]) -> bool:
-        """Оценка условий правила"""
-        try:
-            for condition in self.conditions:
-                # Простая замена переменных
-                eval_condition = condition
-
-                # Заменяем переменные из контекста
-                for key, value in context.items():
-                    if key in eval_condition and isinstance(value, (int, float)):
-                        # Для числовых значений
-                        eval_condition = eval_condition.replace(key, str(value))
-                    elif key in eval_condition and isinstance(value, str):
-                        # Для строковых значений (фазы)
-                        if f"{key} ==" in eval_condition:
-                            eval_condition = eval_condition.replace(f"{key} ==", f"'{value}' ==")
-                        elif f"{key} !=" in eval_condition:
-                            eval_condition = eval_condition.replace(f"{key} !=", f"'{value}' !=")
-
-                # Также заменяем константы
-                if "CAR_LENGTH" in eval_condition:
-                    eval_condition = eval_condition.replace("CAR_LENGTH", str(CAR_LENGTH))
-                if "CAR_WIDTH" in eval_condition:
-                    eval_condition = eval_condition.replace("CAR_WIDTH", str(CAR_WIDTH))
-
-                # Выполняем условие
-                if not eval(eval_condition, {"math": math}, context):
-                    return False
-            return True
-        except Exception as e:
-            # print(f"Ошибка в правиле '{self.name}': {e}, условие: {condition}")
-            return False
-        
+    # Пространство имен сгенерированных функций принятия решения,
+    # из встроенных функций доступны только нужные правилам
+    _globals = {
+        "__builtins__": {"abs": abs, "min": min, "max": max},
+        "math": math,
+        "CAR_LENGTH": CAR_LENGTH,
+        "CAR_WIDTH": CAR_WIDTH
+    }
+
+    def __post_init__(self):
+        # Условие вида phase == '...' определяет фазу, в которой правило применимо
+        self._phase_condition = next((c for c in self.conditions if _phase_literal(c) is not None), None)
+        self._required_phase = _phase_literal(self._phase_condition) if self._phase_condition else None
+
+        # Результат правила со статическими действиями собирается один раз
+        self._static_result = None
+        if not any(isinstance(value, Expr) for value in self.actions.values()):
+            self._static_result = {
+                **self.actions,
+                "rule_applied": self.name,
+                "rule_description": self.description
+            }
+
 
 class DecisionInfo(TypedDict):
     throttle: float
@@ -111,15 +147,48 @@ class DecisionInfo(TypedDict):
     rule_description: str
 
 
+class DecisionRecord(NamedTuple):
+    phase: str
+    decision: DecisionInfo
+    position: Tuple[float, float]
+    angle: float
+    rule_applied: str
+
+
+NO_RULE_DECISION: DecisionInfo = {
+    "throttle": 0.0,
+    "steering": 0.0,
+    "reasoning": "Ожидание...",
+    "emergency": False,
+    "rule_applied": "none",
+    "rule_description": "Правило не найдено"
+}
+
+
 class KnowledgeBase:
     """База знаний с правилами парковки"""
 
     def __init__(self, config: ParkingConfig):
         self.config = config
         self.rules = self._build_rules()
-        self.facts = {}
         self.initialized = False
 
+        # Набор правил неизменен, поэтому сортируем по приоритету один раз
+        self._sorted_rules = sorted(self.rules.values(),
+                                    key=lambda r: r.priority.value,
+                                    reverse=True)
+
+        # Конфиг, константы и начальные значения фактов задаются один раз
+        self.facts = {
+            'config': config,
+            'CAR_LENGTH': CAR_LENGTH,
+            'CAR_WIDTH': CAR_WIDTH,
+            'throttle': 0.0,
+            'steering': 0.0,
+            'emergency': False
+        }
+        self._decide_by_phase, self._decide_any = self._codegen()
+
     def _build_rules(self) -> Dict[str, Rule]:
         """Создание базы правил для парковки"""
         rules = {}
@@ -135,7 +204,7 @@ class KnowledgeBase:
                 "car_x < 300"  # Только в начале пути
             ],
             actions={
-                "throttle": "config.max_speed * 0.7",
+                "throttle": Expr("config.max_speed * 0.7"),
                 "steering": 0.0,
                 "reasoning": "Начало движения по дороге",
                 "emergency": False
@@ -171,7 +240,7 @@ class KnowledgeBase:
                 "throttle > 0"
             ],
             actions={
-                "throttle": "throttle * 0.5",
+                "throttle": Expr("throttle * 0.5"),
                 "steering": 0.0,
                 "reasoning": "Замедление: препятствие впереди",
                 "emergency": False
@@ -190,7 +259,7 @@ class KnowledgeBase:
                 "selected_spot is None"
             ],
             actions={
-                "throttle": "config.max_speed * 0.7",
+                "throttle": Expr("config.max_speed * 0.7"),
                 "steering": 0.0,
                 "reasoning": "Поиск свободного парковочного места",
                 "emergency": False
@@ -207,8 +276,8 @@ class KnowledgeBase:
                 "abs(left_sensor - right_sensor) > 50"
             ],
             actions={
-                "throttle": "config.max_speed * 0.7",
-                "steering": "(right_sensor - left_sensor) * 0.01",
+                "throttle": Expr("config.max_speed * 0.7"),
+                "steering": Expr("(right_sensor - left_sensor) * 0.01"),
                 "reasoning": "Коррекция для движения по центру",
                 "emergency": False
             },
@@ -222,10 +291,11 @@ class KnowledgeBase:
             conditions=[
                 "phase == 'searching'",
                 "selected_spot is not None",
-                "car_x < selected_spot.x - 100"
+                # Совпадает с порогом перехода к фазе подъезда, иначе машина может встать между ними
+                "car_x <= selected_spot.x - 50"
             ],
             actions={
-                "throttle": "config.max_speed * 0.6",
+                "throttle": Expr("config.max_speed * 0.6"),
                 "steering": 0.0,
                 "reasoning": "Найдено место, продолжаем движение",
                 "emergency": False
@@ -245,8 +315,8 @@ class KnowledgeBase:
                 "car_x < selected_spot.x + CAR_LENGTH * 1.5"
             ],
             actions={
-                "throttle": "config.max_speed * 0.5",
-                "steering": "-(car_y - (selected_spot.y - CAR_WIDTH * 1.5)) * 0.008",
+                "throttle": Expr("config.max_speed * 0.5"),
+                "steering": Expr("-(car_y - (selected_spot.y - CAR_WIDTH * 1.5)) * 0.008"),
                 "reasoning": "Подъезд к позиции для парковки",
                 "emergency": False
             },
@@ -284,8 +354,8 @@ class KnowledgeBase:
                 "abs(car_angle) > 2 or abs(car_y - (selected_spot.y - CAR_WIDTH * 1.5)) > 15"
             ],
             actions={
-                "throttle": "config.max_speed * 0.3",
-                "steering": "-car_angle * 0.15 - (car_y - (selected_spot.y - CAR_WIDTH * 1.5)) * 0.01",
+                "throttle": Expr("config.max_speed * 0.3"),
+                "steering": Expr("-car_angle * 0.15 - (car_y - (selected_spot.y - CAR_WIDTH * 1.5)) * 0.01"),
                 "reasoning": "Выравнивание параллельно парковке",
                 "emergency": False
             },
@@ -323,8 +393,8 @@ class KnowledgeBase:
                 "car_angle > -35"
             ],
             actions={
-                "throttle": "-config.max_reverse_speed * 0.3",
-                "steering": "20",
+                "throttle": Expr("-config.max_reverse_speed * 0.3"),
+                "steering": 20.0,
                 "reasoning": "Задний маневр с поворотом",
                 "emergency": False
             },
@@ -340,8 +410,8 @@ class KnowledgeBase:
                 "car_angle <= -30"
             ],
             actions={
-                "throttle": "-config.max_reverse_speed * 0.2",
-                "steering": "0",
+                "throttle": Expr("-config.max_reverse_speed * 0.2"),
+                "steering": 0.0,
                 "reasoning": "Переход к выравниванию",
                 "emergency": False
             },
@@ -357,8 +427,8 @@ class KnowledgeBase:
                 "abs(car_angle) > 3"
             ],
             actions={
-                "throttle": "-config.max_reverse_speed * 0.25",
-                "steering": "-12 - car_angle * 0.1",
+                "throttle": Expr("-config.max_reverse_speed * 0.25"),
+                "steering": Expr("-12 - car_angle * 0.1"),
                 "reasoning": "Выравнивание задним ходом",
                 "emergency": False
             },
@@ -401,73 +471,84 @@ class KnowledgeBase:
         """Обновление фактов в базе знаний"""
         self.facts.update(facts)
 
-        # Добавляем вычисляемые факты
+        # Добавляем вычисляемые факты (квадрат расстояния, сравнивать с квадратом порога)
         if 'car_x' in facts and 'selected_spot' in facts and facts['selected_spot']:
-            self.facts['distance_to_spot'] = math.hypot(
-                facts['car_x'] - facts['selected_spot'].x,
-                facts['car_y'] - facts['selected_spot'].y
-            )
+            dx = facts['car_x'] - facts['selected_spot'].x
+            dy = facts['car_y'] - facts['selected_spot'].y
+            self.facts['distance_to_spot_sq'] = dx * dx + dy * dy
 
-    def infer(self) -> Dict[str, Any]:
+    def infer(self) -> DecisionInfo:
         """Логический вывод на основе правил"""
-        # Добавляем конфиг и константы в факты
-        self.facts['config'] = self.config
-        self.facts['CAR_LENGTH'] = CAR_LENGTH
-        self.facts['CAR_WIDTH'] = CAR_WIDTH
-
-        # Проверяем наличие необходимых фактов
-        if 'throttle' not in self.facts:
-            self.facts['throttle'] = 0.0
-        if 'steering' not in self.facts:
-            self.facts['steering'] = 0.0
-        if 'emergency' not in self.facts:
-            self.facts['emergency'] = False
-
-        # Сортируем правила по приоритету
-        sorted_rules = sorted(self.rules.values(),
-                              key=lambda r: r.priority.value,
-                              reverse=True)
-
-        # Применяем правила
-        for rule in sorted_rules:
-            if rule.evaluate(self.facts):
-                # print(f"✓ Правило применено: {rule.name}")
-
-                actions = rule.actions.copy()
-
-                # Обрабатываем выражения в действиях
-                for key, value in actions.items():
-                    if isinstance(value, str) and any(char in value for char in ['+', '-', '*', '/', '(', ')']):
-                        try:
-                            # Создаем контекст для eval
-                            eval_context = {
-                                'config': self.config,
-                                'CAR_LENGTH': CAR_LENGTH,
-                                'CAR_WIDTH': CAR_WIDTH,
-                                'math': math
-                            }
-                            eval_context.update(self.facts)
-
-                            # Вычисляем выражение
-                            actions[key] = eval(value, {"__builtins__": {}}, eval_context)
-                        except:
-                            # Если не удалось вычислить, оставляем как есть
-                            pass
-
-                actions["rule_applied"] = rule.name
-                actions["rule_description"] = rule.description
-
-                return actions
-
-        # Если ни одно правило не применилось
-        return {
-            "throttle": 0.0,
-            "steering": 0.0,
-            "reasoning": "Ожидание...",
-            "emergency": False,
-            "rule_applied": "none",
-            "rule_description": "Правило не найдено"
-        }
+        decide = self._decide_by_phase.get(self.facts.get('phase'), self._decide_any)
+        return decide(self.facts)
+
+    def _codegen(self) -> Tuple[Dict[str, Callable[[Dict[str, Any]], DecisionInfo]],
+                                Callable[[Dict[str, Any]], DecisionInfo]]:
+        """Компиляция базы правил в функции принятия решения, по одной на каждую фазу"""
+        namespace = {**Rule._globals, "_no_rule": NO_RULE_DECISION}
+
+        phases = [phase.value for phase in ParkingPhase]
+        phases += [rule._required_phase for rule in self._sorted_rules
+                   if rule._required_phase is not None and rule._required_phase not in phases]
+
+        lines = []
+        for phase in phases + [None]:
+            # Правила без условия на фазу проверяются в любой фазе
+            rules = [(i, rule) for i, rule in enumerate(self._sorted_rules)
+                     if rule._required_phase in (None, phase)]
+            lines += self._codegen_function(f"decide_{phase or 'any'}", rules, namespace)
+
+        exec(compile("\n".join(lines), "<knowledge_base>", "exec"), namespace)
+        return ({phase: namespace[f"decide_{phase}"] for phase in phases},
+                namespace["decide_any"])
+
+    @staticmethod
+    def _codegen_function(func_name: str, rules: List[Tuple[int, Rule]],
+                          namespace: Dict[str, Any]) -> List[str]:
+        """Исходный код функции, проверяющей правила в порядке приоритета"""
+        # Условие на фазу уже выполнено выбором функции
+        branches = [(i, rule, [c for c in rule.conditions if c is not rule._phase_condition])
+                    for i, rule in rules]
+
+        # Имена фактов, на которые ссылаются условия и действия
+        fact_names = set()
+        for _, rule, conditions in branches:
+            expressions = conditions + [value.source for value in rule.actions.values()
+                                        if isinstance(value, Expr)]
+            for expression in expressions:
+                for node in ast.walk(ast.parse(expression, mode="eval")):
+                    if (isinstance(node, ast.Name) and node.id not in namespace
+                            and node.id not in namespace["__builtins__"]):
+                        fact_names.add(node.id)
+
+        lines = [f"def {func_name}(f):"]
+        lines += [f"    {name} = f[{name!r}]" for name in sorted(fact_names)]
+
+        for i, rule, conditions in branches:
+            if rule._static_result is None:
+                # Действия с выражениями собираются в новый словарь
+                items = [f"{key!r}: ({value.source})" if isinstance(value, Expr) else f"{key!r}: {value!r}"
+                         for key, value in rule.actions.items()]
+                items.append(f"'rule_applied': {rule.name!r}")
+                items.append(f"'rule_description': {rule.description!r}")
+                result = f"{{{', '.join(items)}}}"
+            else:
+                # Статические действия возвращаются заранее подготовленным словарем
+                namespace[f"_r{i}"] = rule._static_result
+                result = f"_r{i}"
+
+            if not conditions:
+                # Правило срабатывает всегда, следующие недостижимы
+                lines.append(f"    return {result}")
+                break
+
+            lines.append(f"    if {' and '.join(f'({c})' for c in conditions)}:")
+            lines.append(f"        return {result}")
+        else:
+            # Если ни одно правило не применилось
+            lines.append("    return _no_rule")
+
+        return lines
 
 
 class ExpertSystem:
@@ -476,7 +557,9 @@ class ExpertSystem:
     def __init__(self, config: ParkingConfig):
         self.config = config
         self.knowledge_base = KnowledgeBase(config)
-        self.decision_history = []
+        self.decision_history = deque(maxlen=DECISION_HISTORY_SIZE)
+        self.decision_count = 0
+        self.unique_rules = set()
 
     def make_decision(self, phase: ParkingPhase, sensors: List[float],
                       car_pos: Tuple[float, float], car_angle: float,
@@ -509,19 +592,114 @@ class ExpertSystem:
         decision = self.knowledge_base.infer()
 
         # Логируем решение
-        self.decision_history.append({
-            'phase': phase.value,
-            'decision': decision.copy(),
-            'sensors': sensors.copy(),
-            'position': car_pos,
-            'angle': car_angle,
-            'rule_applied': decision.get('rule_applied', 'unknown')
-        })
-
-        return DecisionInfo(**decision)
+        rule_applied = decision.get('rule_applied', 'unknown')
+        self.decision_count += 1
+        self.unique_rules.add(rule_applied)
+        self.decision_history.append(DecisionRecord(
+            phase=phase.value,
+            decision=decision,
+            position=car_pos,
+            angle=car_angle,
+            rule_applied=rule_applied
+        ))
+
+        return decision
+
+
+def _integrate_car(x, y, angle, speed, previous_speed, steering,
+                   turning_radius, acceleration, deceleration, dt):
+    """Шаг физики автомобиля, возвращает новые (x, y, angle, speed)"""
+    # Плавное изменение скорости: ограничиваем изменение с сохранением знака
+    speed_diff = speed - previous_speed
+    max_change = (acceleration if abs(speed) > abs(previous_speed) else deceleration) * dt * 60
+    if abs(speed_diff) > max_change:
+        speed = previous_speed + math.copysign(max_change, speed_diff)
+
+    # Обновление угла
+    if abs(steering) > 0.1 and abs(speed) > 0.1:
+        turning_circle = turning_radius * 30.0 / max(3.0, abs(steering))
+        angular_speed = speed / math.copysign(turning_circle, steering)
+        angle += math.degrees(angular_speed) * dt * 60
+
+    # Обновление позиции
+    rad = math.radians(angle)
+    x += speed * math.cos(rad) * dt * 100
+    y += speed * math.sin(rad) * dt * 100
+    return x, y, angle, speed
+
+
+def _raycast_sensors_numpy(car_x, car_y, sensor_dirs, edges_start, edges_vec, sensor_range):
+    """Расстояния вдоль лучей сенсоров до ближайших ребер препятствий"""
+    dx, dy = sensor_dirs[:, 0], sensor_dirs[:, 1]
+
+    # Пересечение луча каждого сенсора со всеми ребрами препятствий:
+    # car + t * d = p1 + u * e, попадание при t > 0 и 0 <= u <= 1
+    wx = edges_start[:, 0, None] - car_x
+    wy = edges_start[:, 1, None] - car_y
+    ex = edges_vec[:, 0, None]
+    ey = edges_vec[:, 1, None]
+
+    denom = dx * ey - dy * ex
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = (wx * ey - wy * ex) / denom
+        u = (wx * dy - wy * dx) / denom
+
+    hit = (denom != 0) & (t > 0) & (u >= 0) & (u <= 1)
+    dist = np.where(hit, t, sensor_range)
+    return np.minimum(dist.min(axis=0), sensor_range)
+
+
+def _raycast_sensors_loop(car_x, car_y, sensor_dirs, edges_start, edges_vec, sensor_range):
+    """То же, что _raycast_sensors_numpy, в виде цикла для компиляции numba"""
+    sensors = np.full(sensor_dirs.shape[0], float(sensor_range))
+    for j in range(edges_start.shape[0]):
+        wx = edges_start[j, 0] - car_x
+        wy = edges_start[j, 1] - car_y
+        ex = edges_vec[j, 0]
+        ey = edges_vec[j, 1]
+        for i in range(sensor_dirs.shape[0]):
+            dx = sensor_dirs[i, 0]
+            dy = sensor_dirs[i, 1]
+            denom = dx * ey - dy * ex
+            if denom == 0:
+                continue
+            t = (wx * ey - wy * ex) / denom
+            if t <= 0 or t >= sensors[i]:
+                continue
+            u = (wx * dy - wy * dx) / denom
+            if 0 <= u <= 1:
+                sensors[i] = t
+    return sensors
+
+
+# При наличии numba вычислительные ядра компилируются, иначе используется NumPy/Python
+if njit is not None:
+    _integrate_car = njit(cache=True, fastmath=True)(_integrate_car)
+    _raycast_sensors = njit(cache=True, fastmath=True)(_raycast_sensors_loop)
+else:
+    _raycast_sensors = _raycast_sensors_numpy
+
+
+@lru_cache(maxsize=None)
+def _car_body_base(color) -> pygame.Surface:
+    """Неповернутый кузов автомобиля заданного цвета"""
+    body = pygame.Surface((CAR_LENGTH, CAR_WIDTH), pygame.SRCALPHA)
+    body.fill(color)
+    return body
+
+
+@lru_cache(maxsize=512)
+def _car_body_surface(color, angle) -> pygame.Surface:
+    """Кузов автомобиля, повернутый на угол, кратный BODY_ANGLE_STEP"""
+    # Формат пикселей дисплея: блит каждого кадра идет без преобразования
+    return pygame.transform.rotate(_car_body_base(color), -angle).convert_alpha()
 
 
 class Car:
+    __slots__ = ('x', 'y', 'angle', 'speed', 'max_speed', 'steering', 'color', 'turning_radius',
+                 'sensors', 'previous_speed', 'acceleration', 'deceleration',
+                 '_angle_cached', '_sensor_dirs')
+
     def __init__(self, x, y, angle=0, color=(0, 100, 255)):
         self.x = x
         self.y = y
@@ -535,56 +713,21 @@ class Car:
         self.previous_speed = 0.0
         self.acceleration = 0.01
         self.deceleration = 0.02
+        self._angle_cached = None
+        self._sensor_dirs = None
 
     def update(self, dt):
-        # Плавное изменение скорости
-        speed_diff = self.speed - self.previous_speed
-        
-        if speed_diff != 0:
-            is_accelerating = abs(self.speed) > abs(self.previous_speed)
-            
-            if is_accelerating:
-                max_change = self.acceleration * dt * 60
-            else:
-                max_change = self.deceleration * dt * 60
-            
-            # Ограничиваем изменение скорости
-            if abs(speed_diff) > max_change:
-                if speed_diff > 0:
-                    self.speed = self.previous_speed + max_change
-                else:
-                    self.speed = self.previous_speed - max_change
-
+        # Аргументы ядра всегда float: иначе numba компилирует отдельную версию для int
+        self.x, self.y, self.angle, self.speed = _integrate_car(
+            float(self.x), float(self.y), float(self.angle), float(self.speed),
+            float(self.previous_speed), float(self.steering), float(self.turning_radius),
+            float(self.acceleration), float(self.deceleration), float(dt)
+        )
         self.previous_speed = self.speed
 
-        # Обновление угла
-        if abs(self.steering) > 0.1 and abs(self.speed) > 0.1:
-            turning_circle = self.turning_radius / max(0.1, abs(self.steering) / 30.0)
-            angular_speed = self.speed / turning_circle
-
-            if self.steering < 0:
-                angular_speed = -angular_speed
-
-            self.angle += math.degrees(angular_speed) * dt * 60
-
-        # Обновление позиции
-        dx = self.speed * math.cos(math.radians(self.angle)) * dt * 100
-        dy = self.speed * math.sin(math.radians(self.angle)) * dt * 100
-        self.x += dx
-        self.y += dy
-
-    def get_corners(self):
-        c, s = math.cos(math.radians(self.angle)), math.sin(math.radians(self.angle))
-        points = [
-            (-CAR_LENGTH / 2, -CAR_WIDTH / 2),
-            (CAR_LENGTH / 2, -CAR_WIDTH / 2),
-            (CAR_LENGTH / 2, CAR_WIDTH / 2),
-            (-CAR_LENGTH / 2, CAR_WIDTH / 2)
-        ]
-        return [(self.x + x * c - y * s, self.y + x * s + y * c) for x, y in points]
-
     def draw(self, screen):
-        pygame.draw.polygon(screen, self.color, self.get_corners())
+        body = _car_body_surface(self.color, round(self.angle / BODY_ANGLE_STEP) * BODY_ANGLE_STEP)
+        screen.blit(body, body.get_rect(center=(self.x, self.y)))
 
         # Рисование направления
         front = (
@@ -593,50 +736,179 @@ class Car:
         )
         pygame.draw.line(screen, (255, 255, 255), (self.x, self.y), front, 3)
 
-        # Рисование сенсоров
-        sensor_angles = [-135, -90, -45, -20, 20, 45, 90, 135]
-        for i, da in enumerate(sensor_angles):
-            ang = math.radians(self.angle + da)
+        # Рисование сенсоров: лучи одного цвета рисуются одной ломаной через центр
+        center = (self.x, self.y)
+        groups = {}
+        for (dx, dy), dist in zip(self.get_sensor_dirs().tolist(), self.sensors):
             end = (
-                self.x + self.sensors[i] * math.cos(ang),
-                self.y + self.sensors[i] * math.sin(ang)
+                self.x + dist * dx,
+                self.y + dist * dy
             )
-            color = (255, 100, 100) if self.sensors[i] < 80 else (100, 255, 100) if self.sensors[i] < 150 else (100,
-                                                                                                                150,
-                                                                                                                255)
-            pygame.draw.line(screen, color, (self.x, self.y), end, 2)
-
-    def update_sensors(self, obstacles):
+            color = (255, 100, 100) if dist < 80 else (100, 255, 100) if dist < 150 else (100, 150, 255)
+            groups.setdefault(color, []).extend((center, end))
+
+        for color, points in groups.items():
+            pygame.draw.lines(screen, color, False, points, 2)
+
+    def get_sensor_dirs(self) -> np.ndarray:
+        """Единичные векторы направлений сенсоров, форма (8, 2)"""
+        # Пересчитываем только при изменении угла автомобиля
+        if self._angle_cached != self.angle:
+            ang = np.radians(self.angle + SENSOR_ANGLES)
+            self._sensor_dirs = np.stack([np.cos(ang), np.sin(ang)], 1)
+            self._angle_cached = self.angle
+        return self._sensor_dirs
+
+    def update_sensors(self, obstacles: "ObstacleStore"):
         """Обновление показаний сенсоров"""
-        self.sensors = [SENSOR_RANGE] * 8
-        sensor_angles = [-135, -90, -45, -20, 20, 45, 90, 135]
-
-        for i, da in enumerate(sensor_angles):
-            ang = math.radians(self.angle + da)
-            dx, dy = math.cos(ang), math.sin(ang)
+        if len(obstacles) == 0:
+            self.sensors = [SENSOR_RANGE] * 8
+            return self.sensors
 
-            for obs in obstacles:
-                for corner in obs.get_corners():
-                    px, py = corner[0] - self.x, corner[1] - self.y
-                    proj = px * dx + py * dy
+        edges_start, edges_vec = obstacles.get_edges()
+        self.sensors = _raycast_sensors(float(self.x), float(self.y), self.get_sensor_dirs(),
+                                        edges_start, edges_vec, float(SENSOR_RANGE)).tolist()
+        return self.sensors
 
-                    if proj > 0:
-                        dist = math.hypot(px, py)
-                        if dist < self.sensors[i]:
-                            self.sensors[i] = dist
 
-        return self.sensors
+class ObstacleStore:
+    """Препятствия в виде параллельных массивов (SoA) с кэшированной геометрией"""
+
+    def __init__(self, cars: List[Car]):
+        self.xs = np.array([car.x for car in cars], dtype=float)
+        self.ys = np.array([car.y for car in cars], dtype=float)
+        self.angles = np.array([car.angle for car in cars], dtype=float)
+        self._corners = None
+        self._edges = None
+        self.dirty = True
+
+    def __len__(self):
+        return len(self.xs)
+
+    def mark_dirty(self):
+        """Пометить геометрию для пересчета после перемещения препятствий"""
+        self.dirty = True
+
+    def get_corners(self) -> np.ndarray:
+        """Углы всех препятствий, форма (N, 4, 2)"""
+        if self.dirty:
+            self._update_geometry()
+        return self._corners
+
+    def get_edges(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Ребра всех препятствий: начальные точки и векторы, оба формы (N*4, 2)"""
+        if self.dirty:
+            self._update_geometry()
+        return self._edges
+
+    def _update_geometry(self):
+        rad = np.radians(self.angles)[:, None]
+        c, s = np.cos(rad), np.sin(rad)
+        lx, ly = CAR_CORNERS[:, 0], CAR_CORNERS[:, 1]
+
+        self._corners = np.stack([self.xs[:, None] + lx * c - ly * s,
+                                  self.ys[:, None] + lx * s + ly * c], axis=2)
+        edges_vec = np.roll(self._corners, -1, axis=1) - self._corners
+        self._edges = (self._corners.reshape(-1, 2), edges_vec.reshape(-1, 2))
+        self.dirty = False
+
+
+# Автоматические переходы фаз: условие перехода, следующая фаза, сообщение
+PHASE_TRANSITIONS: Dict[ParkingPhase, Tuple[Callable[["ParkingSimulation"], bool], ParkingPhase, str]] = {
+    ParkingPhase.SEARCHING: (
+        lambda sim: sim.selected_spot is not None and sim.player_car.x > sim.selected_spot.x - 50,
+        ParkingPhase.APPROACH,
+        "\n⇨ Переход к фазе: ПОДЪЕЗД\n   Цель: X={sim.selected_spot.x}"
+    ),
+    ParkingPhase.APPROACH: (
+        lambda sim: sim.player_car.x > sim.selected_spot.x + CAR_LENGTH * 1.2,
+        ParkingPhase.POSITIONING,
+        "\n⇨ Переход к фазе: ПОЗИЦИОНИРОВАНИЕ"
+    ),
+    ParkingPhase.POSITIONING: (
+        lambda sim: sim.phase_timer > 3.0,
+        ParkingPhase.PREPARE_REVERSE,
+        "\n⇨ Переход к фазе: ПОДГОТОВКА К РЕВЕРСУ"
+    ),
+    ParkingPhase.PREPARE_REVERSE: (
+        lambda sim: sim.phase_timer > 0.5,
+        ParkingPhase.REVERSE_RIGHT,
+        "\n⇨ Переход к фазе: ЗАДНИЙ МАНЕВР (ВПРАВО)"
+    ),
+    ParkingPhase.REVERSE_RIGHT: (
+        lambda sim: sim.player_car.angle < -25,
+        ParkingPhase.REVERSE_LEFT,
+        "\n⇨ Переход к фазе: ВЫРАВНИВАНИЕ (ВЛЕВО)"
+    ),
+    ParkingPhase.REVERSE_LEFT: (
+        lambda sim: abs(sim.player_car.angle) < 5 or sim.phase_timer > 4.0,
+        ParkingPhase.FINAL_ADJUST,
+        "\n⇨ Переход к фазе: ФИНАЛЬНАЯ КОРРЕКТИРОВКА"
+    ),
+    ParkingPhase.FINAL_ADJUST: (
+        lambda sim: sim.phase_timer > 3.0,
+        ParkingPhase.PARKED,
+        "\n" + "=" * 60 + "\n✓ ПАРКОВКА УСПЕШНО ЗАВЕРШЕНА!\n" + "=" * 60
+    ),
+}
+
+
+def _dumps(obj: Any) -> str:
+    """Сериализация в JSON: orjson при наличии, иначе стандартный json"""
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False)
+
+
+@lru_cache(maxsize=1024)
+def _render(font: pygame.font.Font, text: str, color) -> pygame.Surface:
+    """Сглаженная отрисовка текста с кэшированием по шрифту, тексту и цвету"""
+    return font.render(text, True, color)
+
+
+def _box_surface(size, fill, border, border_width, radius=0) -> pygame.Surface:
+    """Заранее отрисованная рамка интерфейса: заливка и обводка"""
+    surf = pygame.Surface(size, pygame.SRCALPHA)
+    rect = surf.get_rect()
+    pygame.draw.rect(surf, fill, rect, border_radius=radius)
+    if border_width:
+        pygame.draw.rect(surf, border, rect, border_width, border_radius=radius)
+    return surf.convert_alpha()
 
 
 class ParkingSimulation:
     def __init__(self):
+        self._init_pygame()
+        self.reset()
+
+    def _init_pygame(self):
+        """Инициализация окна, шрифтов и таймера (выполняется один раз)"""
         pygame.init()
         self.screen = pygame.display.set_mode((WIDTH, HEIGHT))
         pygame.display.set_caption("ЭКСПЕРТНАЯ СИСТЕМА ПАРКОВКИ - РАБОЧАЯ ВЕРСИЯ")
+        # До создания таймера, чтобы время компиляции не попало в dt первого кадра
+        self._warm_up_kernels()
         self.clock = pygame.time.Clock()
         self.font = pygame.font.SysFont("Arial", 22)
         self.small_font = pygame.font.SysFont("Arial", 16)
-
+        self._build_background()
+        self._build_static_labels()
+        self._build_ui_boxes()
+
+        # Затемнение экрана под сообщением об успешной парковке
+        self._success_overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
+        self._success_overlay.fill((0, 0, 0, 150))
+        self._success_overlay = self._success_overlay.convert_alpha()
+
+    @staticmethod
+    def _warm_up_kernels():
+        """Первый вызов ядер физики и сенсоров: компиляция numba до начала цикла"""
+        car = Car(0.0, 0.0)
+        car.update(1.0 / FPS)
+        car.update_sensors(ObstacleStore([Car(100.0, 0.0)]))
+
+    def reset(self):
+        """Новая парковка: случайные машины и начальное состояние системы"""
         # Конфигурация
         config = ParkingConfig(
             turn_radius_ratio=2.5,
@@ -652,15 +924,21 @@ class ParkingSimulation:
 
         # Парковочные места
         self.parking_spots = self._create_parking_spots()
-
-        # Припаркованные машины
-        self.obstacle_cars = [
-            Car(600, HEIGHT - 150, 0, (200, 0, 0)),
-            Car(900, HEIGHT - 150, 0, (200, 0, 0)),
-        ]
-
-        # Генерируем случайные машины - заменяет предыдущую секцию
+        self._spot_positions = np.array([(spot.x, spot.y) for spot in self.parking_spots], dtype=float)
+        self._spots_surface = None
+        self._spots_key = None
+        self._target_overlay = None
+        self._target_overlay_pos = (0, 0)
+        self._target_spot = None
+        self._cached_reasoning = None
+        self._reasoning_text = ""
+
+        # Припаркованные машины в случайных местах
         self.obstacle_cars = self.generate_random_cars()
+        self.obstacle_store = ObstacleStore(self.obstacle_cars)
+        self._build_obstacles_surface()
+        self._best_spot = None
+        self._best_spot_key = None
 
         # Основной автомобиль
         self.player_car = Car(200, HEIGHT - 200, 0)
@@ -675,6 +953,7 @@ class ParkingSimulation:
         self.current_sensors = [SENSOR_RANGE] * 8
         self.rule_applied = "Начало движения"
         self.start_time = pygame.time.get_ticks()
+        self._total_time = 0.0
 
         # Статистика
         self.rules_applied_count = {}
@@ -729,30 +1008,34 @@ class ParkingSimulation:
 
     def find_best_parking_spot(self) -> Optional[ParkingSpot]:
         """Поиск наилучшего парковочного места"""
-        available_spots = [spot for spot in self.parking_spots if not spot.occupied]
+        # Результат меняется только при изменении занятости мест
+        occupancy = tuple(spot.occupied for spot in self.parking_spots)
+        if occupancy != self._best_spot_key:
+            self._best_spot = self._compute_best_parking_spot()
+            self._best_spot_key = occupancy
 
-        if not available_spots:
-            return None
+        if self._best_spot:
+            print(f"✓ Найдено парковочное место: X={self._best_spot.x}")
 
-        # Выбираем место подальше от препятствий
-        best_spot = None
-        max_distance = 0
+        return self._best_spot
 
-        for spot in available_spots:
-            min_dist_to_obstacle = float('inf')
-            for obs in self.obstacle_cars:
-                dist = abs(obs.x - spot.x)
-                if dist < min_dist_to_obstacle:
-                    min_dist_to_obstacle = dist
+    def _compute_best_parking_spot(self) -> Optional[ParkingSpot]:
+        """Свободное место, наиболее удаленное от препятствий по X"""
+        spots = self.parking_spots
+        free = np.flatnonzero(np.fromiter((not spot.occupied for spot in spots), dtype=bool, count=len(spots)))
 
-            if min_dist_to_obstacle > max_distance:
-                max_distance = min_dist_to_obstacle
-                best_spot = spot
+        if len(free) == 0:
+            return None
 
-        if best_spot:
-            print(f"✓ Найдено парковочное место: X={best_spot.x}")
+        if len(self.obstacle_store) == 0:
+            return spots[free[0]]
 
-        return best_spot
+        # Выбираем место подальше от препятствий
+        spot_xs = self._spot_positions[free, 0]
+        dists = np.abs(spot_xs[:, None] - self.obstacle_store.xs[None, :]).min(axis=1)
+        best = int(dists.argmax())
+
+        return spots[free[best]] if dists[best] > 0 else None
 
     def run(self):
         running = True
@@ -769,7 +1052,7 @@ class ParkingSimulation:
                         print("\n" + "=" * 60)
                         print("ПЕРЕЗАПУСК СИСТЕМЫ...")
                         print("=" * 60)
-                        self.__init__()
+                        self.reset()
                         continue
                     elif event.key == pygame.K_s:
                         self.save_decision_log()
@@ -781,8 +1064,7 @@ class ParkingSimulation:
                         self.debug_info()
 
             # Обновление сенсоров
-            all_obstacles = self.obstacle_cars.copy()
-            self.current_sensors = self.player_car.update_sensors(all_obstacles)
+            self.current_sensors = self.player_car.update_sensors(self.obstacle_store)
 
             # Автоматический поиск места
             if self.current_phase == ParkingPhase.SEARCHING and not self.selected_spot:
@@ -833,59 +1115,26 @@ class ParkingSimulation:
 
     def handle_phase_transitions(self):
         """Обработка переходов между фазами"""
+        transition = PHASE_TRANSITIONS.get(self.current_phase)
+        if transition is None:
+            return
+
+        predicate, next_phase, message = transition
+        if not predicate(self):
+            return
 
-        if self.current_phase == ParkingPhase.SEARCHING:
-            if self.selected_spot and self.player_car.x > self.selected_spot.x - 50:
-                self.current_phase = ParkingPhase.APPROACH
-                self.phase_timer = 0
-                print(f"\n⇨ Переход к фазе: ПОДЪЕЗД")
-                print(f"   Цель: X={self.selected_spot.x}")
-
-        elif self.current_phase == ParkingPhase.APPROACH:
-            if self.player_car.x > self.selected_spot.x + CAR_LENGTH * 1.2:
-                self.current_phase = ParkingPhase.POSITIONING
-                self.phase_timer = 0
-                print(f"\n⇨ Переход к фазе: ПОЗИЦИОНИРОВАНИЕ")
-
-        elif self.current_phase == ParkingPhase.POSITIONING:
-            if self.phase_timer > 3.0:
-                self.current_phase = ParkingPhase.PREPARE_REVERSE
-                self.phase_timer = 0
-                print(f"\n⇨ Переход к фазе: ПОДГОТОВКА К РЕВЕРСУ")
-
-        elif self.current_phase == ParkingPhase.PREPARE_REVERSE:
-            if self.phase_timer > 0.5:
-                self.current_phase = ParkingPhase.REVERSE_RIGHT
-                self.phase_timer = 0
-                print(f"\n⇨ Переход к фазе: ЗАДНИЙ МАНЕВР (ВПРАВО)")
-
-        elif self.current_phase == ParkingPhase.REVERSE_RIGHT:
-            if self.player_car.angle < -25:
-                self.current_phase = ParkingPhase.REVERSE_LEFT
-                self.phase_timer = 0
-                print(f"\n⇨ Переход к фазе: ВЫРАВНИВАНИЕ (ВЛЕВО)")
-
-        elif self.current_phase == ParkingPhase.REVERSE_LEFT:
-            if abs(self.player_car.angle) < 5 or self.phase_timer > 4.0:
-                self.current_phase = ParkingPhase.FINAL_ADJUST
-                self.phase_timer = 0
-                print(f"\n⇨ Переход к фазе: ФИНАЛЬНАЯ КОРРЕКТИРОВКА")
-
-        elif self.current_phase == ParkingPhase.FINAL_ADJUST:
-            if self.phase_timer > 3.0:
-                self.current_phase = ParkingPhase.PARKED
-                self.parked = True
-                print(f"\n" + "=" * 60)
-                print("✓ ПАРКОВКА УСПЕШНО ЗАВЕРШЕНА!")
-                print("=" * 60)
+        self.current_phase = next_phase
+        if next_phase is ParkingPhase.PARKED:
+            self.parked = True
+        else:
+            self.phase_timer = 0
+        print(message.format(sim=self))
 
     def manual_phase_transition(self):
         """Ручной переход фаз"""
-        phases = list(ParkingPhase)
-        current_index = phases.index(self.current_phase)
-        next_index = (current_index + 1) % (len(phases) - 1)
+        next_index = (PHASE_INDEX[self.current_phase] + 1) % (len(PHASES) - 1)
         old_phase = self.current_phase.value
-        self.current_phase = phases[next_index]
+        self.current_phase = PHASES[next_index]
         self.phase_timer = 0
         print(f"\n⇨ Ручной переход: {old_phase} → {self.current_phase.value}")
 
@@ -896,10 +1145,10 @@ class ParkingSimulation:
         print("=" * 60)
 
         total = sum(self.rules_applied_count.values())
+        inv_total = 100.0 / total if total else 0.0
         for rule_name, count in sorted(self.rules_applied_count.items(),
-                                       key=lambda x: x[1], reverse=True):
-            percentage = (count / total) * 100
-            print(f"  {rule_name}: {count} раз ({percentage:.1f}%)")
+                                       key=itemgetter(1), reverse=True):
+            print(f"  {rule_name}: {count} раз ({count * inv_total:.1f}%)")
 
         print(f"\nВсего решений: {total}")
         print("=" * 60)
@@ -909,255 +1158,325 @@ class ParkingSimulation:
         print("\n" + "=" * 60)
         print("ОТЛАДОЧНАЯ ИНФОРМАЦИЯ:")
         print("=" * 60)
+        car = self.player_car
         print(f"Фаза: {self.current_phase.value}")
         print(f"Время фазы: {self.phase_timer:.1f}с")
-        print(f"Позиция: ({self.player_car.x:.0f}, {self.player_car.y:.0f})")
-        print(f"Угол: {self.player_car.angle:.1f}°")
-        print(f"Скорость: {self.player_car.speed:.2f}")
-        print(f"Руль: {self.player_car.steering:.1f}°")
+        print(f"Позиция: ({car.x:.0f}, {car.y:.0f})")
+        print(f"Угол: {car.angle:.1f}°")
+        print(f"Скорость: {car.speed:.2f}")
+        print(f"Руль: {car.steering:.1f}°")
 
         if self.selected_spot:
-            dx = self.selected_spot.x - self.player_car.x
-            dy = self.selected_spot.y - self.player_car.y
+            dx = self.selected_spot.x - car.x
+            dy = self.selected_spot.y - car.y
             dist = math.hypot(dx, dy)
             print(f"Цель: X={self.selected_spot.x}, расстояние: {dist:.0f}")
 
         print(f"Активное правило: {self.rule_applied}")
         print("=" * 60)
 
-    def draw(self):
-        """Отрисовка всей сцены"""
-        self.screen.fill((30, 30, 30))
+    def _build_background(self):
+        """Предварительная отрисовка статичного фона: дорога, разметка, бордюр"""
+        surf = pygame.Surface((WIDTH, HEIGHT))
+        surf.fill((30, 30, 30))
 
         # Дорога
-        pygame.draw.rect(self.screen, (70, 70, 70),
+        pygame.draw.rect(surf, (70, 70, 70),
                          (0, HEIGHT - 320, WIDTH, 270))
 
         # Разметка
         for i in range(0, WIDTH, 60):
-            pygame.draw.line(self.screen, (255, 255, 200),
+            pygame.draw.line(surf, (255, 255, 200),
                              (i, HEIGHT - 200), (i + 30, HEIGHT - 200), 3)
 
         # Бордюр
-        pygame.draw.line(self.screen, (200, 200, 200),
+        pygame.draw.line(surf, (200, 200, 200),
                          (0, HEIGHT - 150), (WIDTH, HEIGHT - 150), 3)
 
-        # Парковочные места
+        # Фон для интерфейса
+        pygame.draw.rect(surf, (40, 40, 50), (0, 0, WIDTH, 180))
+
+        self._bg_surface = surf.convert()
+
+    def _build_static_labels(self):
+        """Предварительная отрисовка неизменных надписей интерфейса"""
+        big_labels = [
+            ("ЭКСПЕРТНАЯ СИСТЕМА ПАРКОВКИ - В РАБОТЕ", (255, 255, 200)),
+            ("ПАРКОВКА ЗАВЕРШЕНА!", (100, 255, 100)),
+        ]
+        small_labels = [
+            ("ЦЕЛЬ", (255, 255, 0)),
+            ("АКТИВНОЕ ПРАВИЛО:", (200, 255, 200)),
+            ("УПРАВЛЕНИЕ:", (200, 220, 255)),
+            ("ОБОСНОВАНИЕ:", (255, 220, 200)),
+            ("ПОЗИЦИЯ АВТО:", (200, 220, 255)),
+            ("ДАКТЧИКИ:", (200, 255, 200)),
+            ("Нажмите R для новой парковки", (150, 255, 150)),
+        ]
+        self._static_labels = {text: self.font.render(text, True, color) for text, color in big_labels}
+        self._static_labels.update(
+            {text: self.small_font.render(text, True, color) for text, color in small_labels})
+
+        # Подсказки управления внизу экрана вместе с их позициями
+        controls = [
+            "R - ПЕРЕЗАПУСК",
+            "S - СОХРАНИТЬ ЛОГ",
+            "SPACE - СЛЕД.ФАЗА",
+            "P - СТАТИСТИКА",
+            "D - ОТЛАДКА"
+        ]
+
+        control_width = WIDTH // len(controls)
+        self._control_surfaces = []
+        for i, control in enumerate(controls):
+            control_text = self.small_font.render(control, True, (180, 200, 220))
+            x_pos = i * control_width + control_width // 2 - control_text.get_width() // 2
+            self._control_surfaces.append((control_text, x_pos))
+
+    def _build_ui_boxes(self):
+        """Предварительная отрисовка рамок интерфейса"""
+        # Альфа из цвета при рисовании прямо на экран игнорируется, поэтому заливки непрозрачные
+        self._rule_box_surf = _box_surface((WIDTH - 100, 60), (60, 70, 60), (100, 150, 100), 2, 5)
+        self._pos_box_surf = _box_surface((280, 100), (50, 50, 70), (100, 100, 150), 2)
+        self._sensor_box_surf = _box_surface((280, 120), (50, 70, 50), (100, 150, 100), 2)
+        self._controls_surf = _box_surface((WIDTH, 70), (40, 40, 60), None, 0)
+        self._success_box_surf = _box_surface((500, 200), (30, 60, 30), (100, 200, 100), 4, 10)
+
+    def _build_spots_surface(self):
+        """Предварительная отрисовка разметки парковочных мест"""
+        surf = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
+        p_text = self.small_font.render("P", True, (0, 220, 0))
+
         for spot in self.parking_spots:
             color = (0, 220, 0) if not spot.occupied else (220, 50, 50)
-            if spot == self.selected_spot:
-                color = (255, 255, 0)
-
-            pygame.draw.rect(self.screen, color,
+            pygame.draw.rect(surf, color,
                              (spot.x - spot.width // 2, spot.y - spot.length // 2,
                               spot.width, spot.length), 3)
 
             if not spot.occupied:
-                p_text = self.small_font.render("P", True, (0, 220, 0))
-                self.screen.blit(p_text, (spot.x - 5, spot.y - 10))
+                surf.blit(p_text, (spot.x - 5, spot.y - 10))
+
+        self._spots_surface = surf.convert_alpha()
 
-            if spot == self.selected_spot:
-                target_text = self.small_font.render("ЦЕЛЬ", True, (255, 255, 0))
-                self.screen.blit(target_text, (spot.x - 15, spot.y - 80))
+    def _build_obstacles_surface(self):
+        """Предварительная отрисовка припаркованных машин: они не двигаются до перезапуска"""
+        surf = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
+        for obstacle in self.obstacle_cars:
+            obstacle.draw(surf)
+
+        self._obstacles_surface = surf.convert_alpha()
+
+    def _build_target_overlay(self, spot: ParkingSpot):
+        """Предварительная отрисовка зоны позиционирования и целевой точки для места"""
+        pos_y = int(spot.y - CAR_WIDTH * 1.5)
+        target_x = int(spot.x + CAR_LENGTH * 1.5)
+        left = int(spot.x) - 100
+        top = pos_y - TARGET_OVERLAY_PAD
+
+        surf = pygame.Surface((301, 2 * TARGET_OVERLAY_PAD + 1), pygame.SRCALPHA)
+
+        # Зона позиционирования
+        pygame.draw.line(surf, (255, 200, 0),
+                         (0, TARGET_OVERLAY_PAD), (300, TARGET_OVERLAY_PAD), 2)
+
+        # Целевая точка
+        pygame.draw.circle(surf, (255, 100, 0),
+                           (target_x - left, TARGET_OVERLAY_PAD), 6)
+
+        self._target_overlay = surf.convert_alpha()
+        self._target_overlay_pos = (left, top)
+        self._target_spot = spot
+
+    def draw(self):
+        """Отрисовка всей сцены"""
+        # Время кадра берется один раз и используется всеми функциями отрисовки
+        now_ms = pygame.time.get_ticks()
+        self._total_time = (now_ms - self.start_time) / 1000.0
+        screen = self.screen
+        blit = screen.blit
+        car = self.player_car
+
+        blit(self._bg_surface, (0, 0))
+        # Фон панели уже в _bg_surface: сцена не должна рисоваться поверх него
+        screen.set_clip((0, 180, WIDTH, HEIGHT - 180))
+
+        # Парковочные места: статичная разметка из кэша, поверх нее выбранное место
+        occupancy = tuple(spot.occupied for spot in self.parking_spots)
+        if occupancy != self._spots_key:
+            self._build_spots_surface()
+            self._spots_key = occupancy
+        blit(self._spots_surface, (0, 0))
+
+        if self.selected_spot:
+            spot = self.selected_spot
+            pygame.draw.rect(screen, (255, 255, 0),
+                             (spot.x - spot.width // 2, spot.y - spot.length // 2,
+                              spot.width, spot.length), 3)
+
+            target_text = self._static_labels["ЦЕЛЬ"]
+            blit(target_text, (spot.x - 15, spot.y - 80))
 
         # Препятствия
-        for car in self.obstacle_cars:
-            car.draw(self.screen)
+        blit(self._obstacles_surface, (0, 0))
 
         # Основной автомобиль
-        self.player_car.draw(self.screen)
+        car.draw(screen)
 
         # Визуализация цели
         if self.selected_spot:
             # Линия к цели
-            pygame.draw.line(self.screen, (255, 255, 0, 150),
-                             (self.player_car.x, self.player_car.y),
+            pygame.draw.line(screen, (255, 255, 0, 150),
+                             (car.x, car.y),
                              (self.selected_spot.x, self.selected_spot.y), 2)
 
-            # Зона позиционирования
-            pos_y = self.selected_spot.y - CAR_WIDTH * 1.5
-            pygame.draw.line(self.screen, (255, 200, 0, 100),
-                             (self.selected_spot.x - 100, pos_y),
-                             (self.selected_spot.x + 200, pos_y), 2)
+            # Зона позиционирования и целевая точка меняются только при выборе места
+            if self.selected_spot is not self._target_spot:
+                self._build_target_overlay(self.selected_spot)
+            blit(self._target_overlay, self._target_overlay_pos)
 
-            # Целевая точка
-            target_x = self.selected_spot.x + CAR_LENGTH * 1.5
-            pygame.draw.circle(self.screen, (255, 100, 0),
-                               (int(target_x), int(pos_y)), 6)
+        screen.set_clip(None)
 
-        # Интерфейс
-        self.draw_expert_system_ui()
+        # Интерфейс: после парковки его закрывает сообщение об успехе
+        if not self.parked:
+            self.draw_expert_system_ui()
 
     def draw_expert_system_ui(self):
         """Отрисовка интерфейса"""
-        # Фон для интерфейса
-        pygame.draw.rect(self.screen, (40, 40, 50, 200), (0, 0, WIDTH, 180))
+        screen = self.screen
+        blit = screen.blit
+        car = self.player_car
+        speed = car.speed
 
         y_offset = 20
 
         # Заголовок
-        title = self.font.render("ЭКСПЕРТНАЯ СИСТЕМА ПАРКОВКИ - В РАБОТЕ", True, (255, 255, 200))
-        self.screen.blit(title, (WIDTH // 2 - title.get_width() // 2, y_offset))
+        title = self._static_labels["ЭКСПЕРТНАЯ СИСТЕМА ПАРКОВКИ - В РАБОТЕ"]
+        blit(title, (WIDTH // 2 - title.get_width() // 2, y_offset))
         y_offset += 40
 
         # Текущая фаза
-        phase_text = self.font.render(f"ФАЗА: {self.current_phase.value.upper()}", True, (255, 200, 100))
-        self.screen.blit(phase_text, (50, y_offset))
+        phase_text = _render(self.font, f"ФАЗА: {self.current_phase.value.upper()}", (255, 200, 100))
+        blit(phase_text, (50, y_offset))
 
         # Время фазы
-        time_text = self.small_font.render(f"Время: {self.phase_timer:.1f}с", True, (200, 200, 200))
-        self.screen.blit(time_text, (WIDTH - 150, y_offset))
+        time_text = _render(self.small_font, f"Время: {self.phase_timer:.1f}с", (200, 200, 200))
+        blit(time_text, (WIDTH - 150, y_offset))
         y_offset += 35
 
         # Активное правило
-        rule_box = pygame.Rect(50, y_offset, WIDTH - 100, 60)
-        pygame.draw.rect(self.screen, (60, 70, 60), rule_box, border_radius=5)
-        pygame.draw.rect(self.screen, (100, 150, 100), rule_box, 2, border_radius=5)
+        blit(self._rule_box_surf, (50, y_offset))
 
-        rule_title = self.small_font.render("АКТИВНОЕ ПРАВИЛО:", True, (200, 255, 200))
-        self.screen.blit(rule_title, (70, y_offset + 10))
+        rule_title = self._static_labels["АКТИВНОЕ ПРАВИЛО:"]
+        blit(rule_title, (70, y_offset + 10))
 
-        rule_name = self.font.render(f"{self.rule_applied}", True, (220, 255, 220))
-        self.screen.blit(rule_name, (70, y_offset + 30))
+        rule_name = _render(self.font, f"{self.rule_applied}", (220, 255, 220))
+        blit(rule_name, (70, y_offset + 30))
         y_offset += 70
 
         # Левая колонка - управление
         left_col = 50
-        control_text = self.small_font.render("УПРАВЛЕНИЕ:", True, (200, 220, 255))
-        self.screen.blit(control_text, (left_col, y_offset))
+        control_text = self._static_labels["УПРАВЛЕНИЕ:"]
+        blit(control_text, (left_col, y_offset))
 
-        speed_color = (200, 255, 200) if self.player_car.speed > 0 else (255, 200,
-                                                                         200) if self.player_car.speed < 0 else (200,
-                                                                                                                 200,
-                                                                                                                 200)
-        speed_text = self.small_font.render(f"Скорость: {self.player_car.speed:.2f}", True, speed_color)
-        self.screen.blit(speed_text, (left_col + 20, y_offset + 25))
+        speed_color = (200, 255, 200) if speed > 0 else (255, 200, 200) if speed < 0 else (200, 200, 200)
+        speed_text = _render(self.small_font, f"Скорость: {speed:.2f}", speed_color)
+        blit(speed_text, (left_col + 20, y_offset + 25))
 
-        steer_text = self.small_font.render(f"Руль: {self.player_car.steering:.1f}°", True, (220, 220, 200))
-        self.screen.blit(steer_text, (left_col + 20, y_offset + 45))
+        steer_text = _render(self.small_font, f"Руль: {car.steering:.1f}°", (220, 220, 200))
+        blit(steer_text, (left_col + 20, y_offset + 45))
 
         # Правая колонка - обоснование
         right_col = WIDTH // 2 + 50
-        reason_text = self.small_font.render("ОБОСНОВАНИЕ:", True, (255, 220, 200))
-        self.screen.blit(reason_text, (right_col, y_offset))
+        reason_text = self._static_labels["ОБОСНОВАНИЕ:"]
+        blit(reason_text, (right_col, y_offset))
 
         reasoning = self.decision_info.get("reasoning", "Ожидание...")
-        if len(reasoning) > 35:
-            reasoning = reasoning[:35] + "..."
-        reason_content = self.small_font.render(reasoning, True, (255, 240, 200))
-        self.screen.blit(reason_content, (right_col + 20, y_offset + 25))
+        # Обоснование меняется только с решением системы: обрезка строки лишь при смене
+        if reasoning != self._cached_reasoning:
+            self._reasoning_text = reasoning[:35] + "..." if len(reasoning) > 35 else reasoning
+            self._cached_reasoning = reasoning
+        reason_content = _render(self.small_font, self._reasoning_text, (255, 240, 200))
+        blit(reason_content, (right_col + 20, y_offset + 25))
 
         # Позиция автомобиля (правый верхний угол)
         pos_y = 20
-        pos_box = pygame.Rect(WIDTH - 300, pos_y, 280, 100)
-        pygame.draw.rect(self.screen, (50, 50, 70, 200), pos_box)
-        pygame.draw.rect(self.screen, (100, 100, 150), pos_box, 2)
+        blit(self._pos_box_surf, (WIDTH - 300, pos_y))
 
-        pos_title = self.small_font.render("ПОЗИЦИЯ АВТО:", True, (200, 220, 255))
-        self.screen.blit(pos_title, (WIDTH - 280, pos_y + 10))
+        pos_title = self._static_labels["ПОЗИЦИЯ АВТО:"]
+        blit(pos_title, (WIDTH - 280, pos_y + 10))
 
         pos_info = [
-            f"X: {self.player_car.x:.0f}",
-            f"Y: {self.player_car.y:.0f}",
-            f"Угол: {self.player_car.angle:.1f}°"
+            f"X: {car.x:.0f}",
+            f"Y: {car.y:.0f}",
+            f"Угол: {car.angle:.1f}°"
         ]
 
         for i, line in enumerate(pos_info):
-            line_text = self.small_font.render(line, True, (220, 220, 240))
-            self.screen.blit(line_text, (WIDTH - 280, pos_y + 35 + i * 18))
+            line_text = _render(self.small_font, line, (220, 220, 240))
+            blit(line_text, (WIDTH - 280, pos_y + 35 + i * 18))
 
         # Датчики
         sensor_y = pos_y + 110
-        sensor_box = pygame.Rect(WIDTH - 300, sensor_y, 280, 120)
-        pygame.draw.rect(self.screen, (50, 70, 50, 200), sensor_box)
-        pygame.draw.rect(self.screen, (100, 150, 100), sensor_box, 2)
-
-        sensor_title = self.small_font.render("ДАКТЧИКИ:", True, (200, 255, 200))
-        self.screen.blit(sensor_title, (WIDTH - 280, sensor_y + 10))
-
-        sensor_names = ["Перед", "Прав", "Зад.пр", "Зад"]
-        sensor_values = [
-            self.current_sensors[3],  # Передний
-            self.current_sensors[5],  # Правый
-            self.current_sensors[6],  # Задний правый
-            self.current_sensors[7]   # Задний
-        ]
-
-        for i, (name, value) in enumerate(zip(sensor_names, sensor_values)):
-            sensor_x = WIDTH - 280 + (i % 2) * 120
-            sensor_y_pos = sensor_y + 35 + (i // 2) * 25
-
-            if value < 80:
-                color = (255, 150, 150)
-            elif value < 150:
-                color = (255, 255, 150)
-            else:
-                color = (150, 255, 150)
-
-            sensor_text = self.small_font.render(f"{name}: {value:.0f}", True, color)
-            self.screen.blit(sensor_text, (sensor_x, sensor_y_pos))
+        blit(self._sensor_box_surf, (WIDTH - 300, sensor_y))
+
+        sensor_title = self._static_labels["ДАКТЧИКИ:"]
+        blit(sensor_title, (WIDTH - 280, sensor_y + 10))
+
+        # Цвет показания выбирается по порогам 80 и 150 без ветвлений
+        front, right, rear_right, rear = (self.current_sensors[3], self.current_sensors[5],
+                                          self.current_sensors[6], self.current_sensors[7])
+        left_x, right_x = WIDTH - 280, WIDTH - 160
+        top_y, bottom_y = sensor_y + 35, sensor_y + 60
+
+        blit(_render(self.small_font, f"Перед: {front:.0f}",
+             SENSOR_TEXT_COLORS[(front >= 80) + (front >= 150)]), (left_x, top_y))
+        blit(_render(self.small_font, f"Прав: {right:.0f}",
+             SENSOR_TEXT_COLORS[(right >= 80) + (right >= 150)]), (right_x, top_y))
+        blit(_render(self.small_font, f"Зад.пр: {rear_right:.0f}",
+             SENSOR_TEXT_COLORS[(rear_right >= 80) + (rear_right >= 150)]), (left_x, bottom_y))
+        blit(_render(self.small_font, f"Зад: {rear:.0f}",
+             SENSOR_TEXT_COLORS[(rear >= 80) + (rear >= 150)]), (right_x, bottom_y))
 
         # Управление внизу
         controls_y = HEIGHT - 70
-        pygame.draw.rect(self.screen, (40, 40, 60), (0, controls_y, WIDTH, 70))
+        blit(self._controls_surf, (0, controls_y))
 
-        controls = [
-            "R - ПЕРЕЗАПУСК",
-            "S - СОХРАНИТЬ ЛОГ",
-            "SPACE - СЛЕД.ФАЗА",
-            "P - СТАТИСТИКА",
-            "D - ОТЛАДКА"
-        ]
-
-        control_width = WIDTH // len(controls)
-        for i, control in enumerate(controls):
-            control_text = self.small_font.render(control, True, (180, 200, 220))
-            x_pos = i * control_width + control_width // 2 - control_text.get_width() // 2
-            self.screen.blit(control_text, (x_pos, controls_y + 15))
+        for control_text, x_pos in self._control_surfaces:
+            blit(control_text, (x_pos, controls_y + 15))
 
         # Статистика
-        total_time = (pygame.time.get_ticks() - self.start_time) / 1000.0
+        # Счетчик решений меняется каждый кадр, поэтому строка не кэшируется
         stats_text = self.small_font.render(
-            f"Решений: {len(self.expert_system.decision_history)} | " +
-            f"Время: {total_time:.1f}с | " +
+            f"Решений: {self.expert_system.decision_count} | " +
+            f"Время: {self._total_time:.1f}с | " +
             f"Фаза: {self.phase_timer:.1f}с",
             True, (150, 180, 200)
         )
-        self.screen.blit(stats_text, (WIDTH // 2 - stats_text.get_width() // 2, controls_y + 40))
+        blit(stats_text, (WIDTH // 2 - stats_text.get_width() // 2, controls_y + 40))
 
     def draw_success_message(self):
         """Отрисовка сообщения об успешной парковке"""
-        overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
-        overlay.fill((0, 0, 0, 150))
-        self.screen.blit(overlay, (0, 0))
+        self.screen.blit(self._success_overlay, (0, 0))
 
-        success_box = pygame.Rect(WIDTH // 2 - 250, HEIGHT // 2 - 100, 500, 200)
-        pygame.draw.rect(self.screen, (30, 60, 30), success_box, border_radius=10)
-        pygame.draw.rect(self.screen, (100, 200, 100), success_box, 4, border_radius=10)
+        self.screen.blit(self._success_box_surf, (WIDTH // 2 - 250, HEIGHT // 2 - 100))
 
-        success_text = self.font.render("ПАРКОВКА ЗАВЕРШЕНА!",
-                                        True, (100, 255, 100))
+        success_text = self._static_labels["ПАРКОВКА ЗАВЕРШЕНА!"]
         self.screen.blit(success_text,
                          (WIDTH // 2 - success_text.get_width() // 2, HEIGHT // 2 - 70))
 
-        rules_used = len(set([d.get("rule_applied") for d in self.expert_system.decision_history]))
-        total_time = (pygame.time.get_ticks() - self.start_time) / 1000.0
-
+        rules_used = len(self.expert_system.unique_rules)
         stats_lines = [
             f"Использовано правил: {rules_used}",
-            f"Всего решений: {len(self.expert_system.decision_history)}",
-            f"Общее время: {total_time:.1f} секунд"
+            f"Всего решений: {self.expert_system.decision_count}",
+            f"Общее время: {self._total_time:.1f} секунд"
         ]
 
         for i, line in enumerate(stats_lines):
-            line_text = self.small_font.render(line, True, (200, 255, 200))
+            line_text = _render(self.small_font, line, (200, 255, 200))
             self.screen.blit(line_text,
                              (WIDTH // 2 - line_text.get_width() // 2, HEIGHT // 2 - 30 + i * 25))
 
-        restart_text = self.small_font.render(
-            "Нажмите R для новой парковки",
-            True, (150, 255, 150)
-        )
+        restart_text = self._static_labels["Нажмите R для новой парковки"]
         self.screen.blit(restart_text,
                          (WIDTH // 2 - restart_text.get_width() // 2, HEIGHT // 2 + 50))
 
@@ -1166,22 +1485,27 @@ class ParkingSimulation:
         try:
             filename = f"parking_log_{pygame.time.get_ticks()}.json"
             with open(filename, "w", encoding="utf-8") as f:
-                log_data = []
+                # Записи пишутся в файл по одной, без сборки всего лога в памяти
+                f.write("[\n")
+                count = 0
                 for entry in self.expert_system.decision_history:
                     log_entry = {
-                        "phase": entry["phase"],
-                        "rule": entry.get("rule_applied", "unknown"),
-                        "reasoning": entry["decision"].get("reasoning", ""),
-                        "throttle": entry["decision"].get("throttle", 0),
-                        "steering": entry["decision"].get("steering", 0),
-                        "position": entry["position"],
-                        "angle": entry["angle"]
+                        "phase": entry.phase,
+                        "rule": entry.rule_applied,
+                        "reasoning": entry.decision.get("reasoning", ""),
+                        "throttle": entry.decision.get("throttle", 0),
+                        "steering": entry.decision.get("steering", 0),
+                        "position": entry.position,
+                        "angle": entry.angle
                     }
-                    log_data.append(log_entry)
+                    if count:
+                        f.write(",\n")
+                    f.write("  " + _dumps(log_entry))
+                    count += 1
+                f.write("\n]\n")
 
-                json.dump(log_data, f, indent=2, ensure_ascii=False)
                 print(f"\n✓ Лог сохранен в файл: {filename}")
-                print(f"   Записей: {len(log_data)}")
+                print(f"   Записей: {count}")
 
         except Exception as e:
             print(f"\n✗ Ошибка сохранения: {e}")